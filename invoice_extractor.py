@@ -1,13 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 import PyPDF2
 import json
 import re
 from datetime import datetime
 import openai
-from typing import Dict, List, Optional
+from typing import Dict, Optional, Tuple
 
 # Initialize OpenAI API key
 openai.api_key = st.secrets["OPENAI_API_KEY_Invoice"]
@@ -27,35 +27,145 @@ GAS_FACTORS = {
     for year, factor in st.secrets["conversion_factors"]["GAS_FACTORS"].items()
 }
 
+# Sorted year/factor arrays for vectorised lookups
+_ELEC_YEARS = np.array(sorted(ELECTRICITY_FACTORS))
+_ELEC_LUT = np.array([ELECTRICITY_FACTORS[year] for year in _ELEC_YEARS], dtype=float)
+_GAS_YEARS = np.array(sorted(GAS_FACTORS))
+_GAS_LUT = np.array([GAS_FACTORS[year] for year in _GAS_YEARS], dtype=float)
+
+# Latest published factors, used for years DEFRA has not covered yet
+_LATEST_ELEC_FACTOR = ELECTRICITY_FACTORS[max(ELECTRICITY_FACTORS)]
+_LATEST_GAS_FACTOR = GAS_FACTORS[max(GAS_FACTORS)]
+
 
 
 # Constants
 MAX_FILES = 5
 
+# Overview charts are not edited or exported, so skip the mode bar
+PLOTLY_CONFIG = {'displayModeBar': False, 'responsive': True}
+
+# Trace colour per energy type, shared by every chart
+ENERGY_COLORS = {
+    'electricity': '#1f77b4',
+    'gas': '#ff7f0e'
+}
+
+# Static Plotly layouts, shared across reruns. A fixed uirevision keeps
+# the user's zoom and legend state when a chart is redrawn
+USAGE_TREND_LAYOUT = {
+    'title': 'Energy Usage Trend with Moving Average',
+    'uirevision': 'usage_trend',
+    'xaxis_title': 'Date',
+    'yaxis_title': 'Usage (kWh)',
+    'hovermode': 'x unified',
+    'showlegend': True
+}
+
+EMISSIONS_TREND_LAYOUT = {
+    'title': 'Monthly Carbon Emissions',
+    'uirevision': 'emissions_trend',
+    'xaxis_title': 'Date',
+    'yaxis_title': 'Emissions (tCO2e)',
+    'hovermode': 'x unified'
+}
+
+EMISSIONS_VS_USAGE_LAYOUT = {
+    'title': 'Energy Usage vs Carbon Emissions',
+    'uirevision': 'emissions_vs_usage',
+    'xaxis_title': 'Energy Usage (kWh)',
+    'yaxis_title': 'Emissions (tCO2e)',
+    'hovermode': 'closest'
+}
+
+MONTHLY_USAGE_LAYOUT = {
+    'title': 'Monthly Energy Usage Comparison',
+    'uirevision': 'monthly_usage',
+    'xaxis_title': 'Month',
+    'yaxis_title': 'Usage (kWh)',
+    'barmode': 'group',
+    # Label the datetime axis by month instead of pre-formatting strings
+    'xaxis': {'tickangle': 45, 'tickformat': '%B %Y', 'dtick': 'M1'}
+}
+
+EMISSIONS_PIE_LAYOUT = {
+    'title': 'Emissions Distribution by Energy Type',
+    'uirevision': 'emissions_pie',
+    'showlegend': True
+}
+
+EMISSIONS_PIE_TRACE_STYLE = {
+    'textposition': 'inside',
+    'textinfo': 'percent+label',
+    'hovertemplate': "Energy Type: %{label}<br>Emissions: %{value:.1f} tCO2e<br>Percentage: %{percent}"
+}
+
+REDUCTION_TARGETS_LAYOUT = {
+    'title': '5-Year Emission Reduction Targets',
+    'uirevision': 'reduction_targets',
+    'xaxis_title': 'Years from Now',
+    'yaxis_title': 'Emissions (tCO2e)',
+    'showlegend': True
+}
+
+# Environmental impact cards as (label, value template, caption template),
+# in the same order as the equivalents computed for them
+IMPACT_CARDS = (
+    ("Trees Needed for Offset", "{:,d}", "🌳 Equivalent to planting {:,d} trees"),
+    ("Car Travel Equivalent", "{:,d} km", "🚗 Equal to driving {:,d} kilometers"),
+    ("Home Energy Equivalent", "{:,d}", "🏠 Equal to {:,d} homes' annual usage")
+)
+
+# Seasonal sample usage (kWh), one row per month and one column per
+# energy type, interleaved in the order the sample rows are emitted
+SAMPLE_USAGE_PATTERNS = np.column_stack([
+    [12000, 11500, 11000, 10500,  # Winter/Spring
+     10000, 9500, 9000, 8500,     # Spring/Summer
+     8000, 8500, 9000, 9500],     # Summer/Fall
+    [7000, 7500, 7200, 7100,      # Winter/Spring
+     7000, 6900, 6800, 6700,      # Spring/Summer
+     6600, 6700, 6800, 6900]      # Summer/Fall
+])
+
+# Sensitive-data patterns, compiled once at import
+REDACTION_PATTERNS = {
+    key: re.compile(pattern, flags=re.IGNORECASE)
+    for key, pattern in {
+        'email': r'\b[\w\.-]+@[\w\.-]+\.\w+\b',
+        'uk_phone': r'\b(?:(?:\+44|0)\s?\d{4}\s?\d{6}|\d{3}[-\.\s]?\d{4}[-\.\s]?\d{4})\b',
+        'postcode': r'\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b',
+        'account_number': r'\b\d{8,12}\b',
+        'sort_code': r'\b\d{2}[-\s]?\d{2}[-\s]?\d{2}\b',
+        'address': r'\d+\s+[A-Za-z\s]+(?:Road|Street|Ave|Avenue|Close|Lane|Drive|Rd|St|Ave)\b',
+        'credit_card': r'\b(?:\d[ -]*?){13,16}\b',
+        'national_insurance': r'\b[A-CEGHJ-PR-TW-Z]{1}[A-CEGHJ-NPR-TW-Z]{1}[0-9]{6}[A-DFM]{1}\b',
+        'company_number': r'\b\d{8}\b'
+    }.items()
+}
+
+# Fields returned for every invoice, whether or not extraction succeeded
+INVOICE_FIELDS = ['kwh', 'billing_period_start', 'billing_period_end', 'provider', 'type']
+
 
 
 class InvoiceProcessor:
     @staticmethod
     def redact_sensitive_data(text: str) -> str:
         """Redact sensitive information from text."""
-        patterns = {
-            'email': r'\b[\w\.-]+@[\w\.-]+\.\w+\b',
-            'uk_phone': r'\b(?:(?:\+44|0)\s?\d{4}\s?\d{6}|\d{3}[-\.\s]?\d{4}[-\.\s]?\d{4})\b',
-            'postcode': r'\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b',
-            'account_number': r'\b\d{8,12}\b',
-            'sort_code': r'\b\d{2}[-\s]?\d{2}[-\s]?\d{2}\b',
-            'address': r'\d+\s+[A-Za-z\s]+(?:Road|Street|Ave|Avenue|Close|Lane|Drive|Rd|St|Ave)\b',
-            'credit_card': r'\b(?:\d[ -]*?){13,16}\b',
-            'national_insurance': r'\b[A-CEGHJ-PR-TW-Z]{1}[A-CEGHJ-NPR-TW-Z]{1}[0-9]{6}[A-DFM]{1}\b',
-            'company_number': r'\b\d{8}\b'
-        }
         redacted_text = text
-        for key, pattern in patterns.items():
-            redacted_text = re.sub(pattern, f'[{key.upper()}_REDACTED]', redacted_text, flags=re.IGNORECASE)
+        for key, pattern in REDACTION_PATTERNS.items():
+            redacted_text = pattern.sub(f'[{key.upper()}_REDACTED]', redacted_text)
         return redacted_text
 
     @staticmethod
-    def extract_invoice_data(text: str, energy_type: str) -> Dict:
+    def empty_result(energy_type: str) -> Dict:
+        """Placeholder result for an invoice whose data could not be extracted."""
+        result = dict.fromkeys(INVOICE_FIELDS)
+        result['type'] = energy_type
+        return result
+
+    @staticmethod
+    def extract_invoice_data(text: str, energy_type: str) -> Optional[Dict]:
         """Extract data using OpenAI API with enhanced error handling."""
         try:
             response = openai.ChatCompletion.create(
@@ -96,31 +206,20 @@ class InvoiceProcessor:
             
             try:
                 result = json.loads(content)
-                required_fields = ['kwh', 'billing_period_start', 'billing_period_end', 'provider', 'type']
-                for field in required_fields:
+                for field in INVOICE_FIELDS:
                     if field not in result:
                         result[field] = energy_type if field == 'type' else None
                 return result
             
             except json.JSONDecodeError as e:
                 st.error(f"Invalid JSON response from OpenAI: {content}")
-                return {
-                    'kwh': None,
-                    'billing_period_start': None,
-                    'billing_period_end': None,
-                    'provider': None,
-                    'type': energy_type
-                }
+                return InvoiceProcessor.empty_result(energy_type)
                 
         except Exception as e:
+            # No placeholder: API errors may be transient, so the invoice is
+            # sent again on the next rerun
             st.error(f"Error processing with OpenAI: {str(e)}")
-            return {
-                'kwh': None,
-                'billing_period_start': None,
-                'billing_period_end': None,
-                'provider': None,
-                'type': energy_type
-            }
+            return None
 
     @staticmethod
     def process_pdf(uploaded_file, energy_type: str) -> Optional[Dict]:
@@ -144,34 +243,67 @@ class InvoiceProcessor:
 
 class CarbonCalculator:
     @staticmethod
-    def get_factor(year: int, energy_type: str) -> float:
-        """Get DEFRA conversion factor for the given year and energy type."""
-        return ELECTRICITY_FACTORS.get(year) if energy_type == 'electricity' else GAS_FACTORS.get(year)
+    def lookup_factors(years: np.ndarray, table_years: np.ndarray, table_factors: np.ndarray,
+                       fallback: float) -> np.ndarray:
+        """Map an array of years onto a factor table, using the fallback for years after it."""
+        years = np.asarray(years)
+        pos = np.searchsorted(table_years, years)
+        # Years before the table take its earliest factor; only years DEFRA
+        # has not published yet (and NaN years, which sort last) fall back
+        idx = np.clip(pos, 0, max(len(table_years) - 1, 0))
+        return np.where(pos < len(table_years), table_factors[idx], fallback)
+
+    @staticmethod
+    def get_factors(years: pd.Series, energy_types: pd.Series) -> np.ndarray:
+        """Vectorised DEFRA factor lookup for whole columns of years and energy types."""
+        elec = CarbonCalculator.lookup_factors(years, _ELEC_YEARS, _ELEC_LUT, _LATEST_ELEC_FACTOR)
+        gas = CarbonCalculator.lookup_factors(years, _GAS_YEARS, _GAS_LUT, _LATEST_GAS_FACTOR)
+        return np.where(np.asarray(energy_types) == 'electricity', elec, gas)
 
     @staticmethod
     def calculate_metrics(df: pd.DataFrame) -> Dict:
         """Calculate carbon emissions and related metrics for gas and electricity."""
-        df['year'] = pd.to_datetime(df['billing_period_start']).dt.year
-        df['carbon_factor'] = df.apply(lambda x: CarbonCalculator.get_factor(x['year'], x['type']), axis=1)
+        # Billing dates are parsed to datetime64 when the data is loaded
+        df['year'] = df['billing_period_start'].dt.year
+        df['carbon_factor'] = CarbonCalculator.get_factors(df['year'], df['type'])
         df['emissions_kg'] = df['kwh'] * df['carbon_factor']
         df['emissions_tonnes'] = df['emissions_kg'] / 1000
 
         # Calculate year-over-year changes
-        df['year_month'] = pd.to_datetime(df['billing_period_start']).dt.to_period('M')
-        yoy_changes = df.groupby(['type', df['billing_period_start'].dt.year]).agg({
-            'kwh': ['sum', 'mean'],
-            'emissions_tonnes': ['sum', 'mean']
-        }).pct_change()
+        df['year_month'] = df['billing_period_start'].dt.to_period('M')
+        yearly = df.groupby(['type', 'year']).agg(
+            kwh_sum=('kwh', 'sum'),
+            kwh_mean=('kwh', 'mean'),
+            emissions_tonnes_sum=('emissions_tonnes', 'sum'),
+            emissions_tonnes_mean=('emissions_tonnes', 'mean')
+        )
+        # One array pass for every column; the first year of each type
+        # has no prior year to compare against. A NaN aggregate (e.g. the
+        # mean of a year with no kWh values) gives NaN on both sides rather
+        # than being padded from the previous year as pct_change would
+        totals = yearly.to_numpy(dtype=float)
+        types = yearly.index.get_level_values('type').to_numpy()
+        changes = np.full_like(totals, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes[1:] = np.where(
+                (types[1:] == types[:-1])[:, None],
+                totals[1:] / totals[:-1] - 1,
+                np.nan
+            )
+        yoy_changes = pd.DataFrame(changes, index=yearly.index, columns=yearly.columns)
 
         # Scope emissions calculations
-        scope1_emissions = df[df['type'] == 'gas']['emissions_tonnes'].sum()
-        scope2_emissions = df[df['type'] == 'electricity']['emissions_tonnes'].sum()
+        emissions_by_type = df.groupby('type')['emissions_tonnes'].sum()
+        scope1_emissions = emissions_by_type.get('gas', 0.0)
+        scope2_emissions = emissions_by_type.get('electricity', 0.0)
         total_emissions_tonnes = scope1_emissions + scope2_emissions
 
         return {
             'total_emissions_tonnes': total_emissions_tonnes,
+            'total_emissions_kg': df['emissions_kg'].sum(),
             'scope1_emissions_tonnes': scope1_emissions,
             'scope2_emissions_tonnes': scope2_emissions,
+            'emissions_by_type': emissions_by_type,
             'yoy_changes': yoy_changes
         }
 
@@ -192,10 +324,14 @@ class Dashboard:
             "Select Chart Type",
             ["Line Chart", "Bar Chart", "Area Chart"]
         )
-        self.color_scheme = {
-            'electricity': '#1f77b4',
-            'gas': '#ff7f0e'
-        }
+
+    @staticmethod
+    def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+        """Trailing moving average, NaN until a full window is available."""
+        averages = np.full(len(values), np.nan)
+        if len(values) >= window:
+            averages[window - 1:] = np.convolve(values, np.ones(window) / window, mode='valid')
+        return averages
 
     def create_usage_chart(self, df: pd.DataFrame):
         """Generate energy usage trend chart."""
@@ -203,113 +339,102 @@ class Dashboard:
         
         for energy_type in df['type'].unique():
             type_df = df[df['type'] == energy_type]
+            usage = type_df['kwh'].to_numpy(dtype=float)
             
             # Main usage line
             fig.add_trace(go.Scatter(
                 x=type_df['billing_period_start'],
-                y=type_df['kwh'],
+                y=usage,
                 name=f"{energy_type.capitalize()} Usage",
                 mode='lines+markers',
-                line=dict(color=self.color_scheme[energy_type])
+                line=dict(color=ENERGY_COLORS[energy_type])
             ))
             
             # Add moving average
-            type_df['MA3'] = type_df['kwh'].rolling(window=3).mean()
             fig.add_trace(go.Scatter(
                 x=type_df['billing_period_start'],
-                y=type_df['MA3'],
+                y=Dashboard.moving_average(usage, window=3),
                 name=f"{energy_type.capitalize()} 3-Month MA",
                 line=dict(
                     dash='dash',
-                    color=self.color_scheme[energy_type]
+                    color=ENERGY_COLORS[energy_type]
                 )
             ))
         
-        fig.update_layout(
-            title='Energy Usage Trend with Moving Average',
-            xaxis_title='Date',
-            yaxis_title='Usage (kWh)',
-            hovermode='x unified',
-            showlegend=True
-        )
+        fig.update_layout(**USAGE_TREND_LAYOUT)
         return fig
 
     def create_emissions_charts(self, df: pd.DataFrame):
         """Create emissions-related visualizations."""
-        # Monthly emissions trend
         emissions_trend = go.Figure()
+        emissions_vs_usage = go.Figure()
         
+        # Both figures share one pass over the per-type slices
         for energy_type in df['type'].unique():
             type_df = df[df['type'] == energy_type]
+            emissions = type_df['emissions_tonnes'].to_numpy(dtype=float)
+            
+            # Monthly emissions trend
             emissions_trend.add_trace(go.Scatter(
                 x=type_df['billing_period_start'],
-                y=type_df['emissions_tonnes'],
+                y=emissions,
                 name=f"{energy_type.capitalize()} Emissions",
                 mode='lines+markers',
-                line=dict(color=self.color_scheme[energy_type])
+                line=dict(color=ENERGY_COLORS[energy_type])
             ))
-        
-        emissions_trend.update_layout(
-            title='Monthly Carbon Emissions',
-            xaxis_title='Date',
-            yaxis_title='Emissions (tCO2e)',
-            hovermode='x unified'
-        )
-
-        # Usage vs Emissions scatter plot
-        emissions_vs_usage = go.Figure()
-        
-        for energy_type in df['type'].unique():
-            type_df = df[df['type'] == energy_type]
+            
+            # Usage vs Emissions scatter plot
             emissions_vs_usage.add_trace(go.Scatter(
-                x=type_df['kwh'],
-                y=type_df['emissions_tonnes'],
+                x=type_df['kwh'].to_numpy(dtype=float),
+                y=emissions,
                 name=f"{energy_type.capitalize()}",
                 mode='markers',
-                marker=dict(color=self.color_scheme[energy_type])
+                marker=dict(color=ENERGY_COLORS[energy_type])
             ))
         
-        emissions_vs_usage.update_layout(
-            title='Energy Usage vs Carbon Emissions',
-            xaxis_title='Energy Usage (kWh)',
-            yaxis_title='Emissions (tCO2e)',
-            hovermode='closest'
-        )
+        emissions_trend.update_layout(**EMISSIONS_TREND_LAYOUT)
+        emissions_vs_usage.update_layout(**EMISSIONS_VS_USAGE_LAYOUT)
 
         return emissions_trend, emissions_vs_usage
 
-    def display_monthly_comparison(self, df: pd.DataFrame):
-        """Display monthly usage and emissions comparison."""
-        monthly_df = df.copy()
-        monthly_df['month_year'] = monthly_df['billing_period_start'].dt.strftime('%B %Y')
-        
-        st.subheader("Monthly Comparison by Energy Type")
-
-        # Create monthly comparison chart
+    def create_monthly_comparison_chart(self, df: pd.DataFrame):
+        """Create grouped monthly usage bars by energy type."""
         fig = go.Figure()
         
         for energy_type in df['type'].unique():
-            type_df = monthly_df[monthly_df['type'] == energy_type]
+            type_df = df[df['type'] == energy_type]
             fig.add_trace(go.Bar(
-                x=type_df['month_year'],
-                y=type_df['kwh'],
+                # Snap invoices to their month so both types share a bar group
+                x=type_df['year_month'].dt.to_timestamp(),
+                y=type_df['kwh'].to_numpy(dtype=float),
                 name=f"{energy_type.capitalize()} Usage",
-                marker_color=self.color_scheme[energy_type]
+                marker_color=ENERGY_COLORS[energy_type]
             ))
         
-        fig.update_layout(
-            title='Monthly Energy Usage Comparison',
-            xaxis_title='Month',
-            yaxis_title='Usage (kWh)',
-            barmode='group',
-            xaxis={'tickangle': 45}
-        )
+        fig.update_layout(**MONTHLY_USAGE_LAYOUT)
+        return fig
+
+    def create_emissions_pie_chart(self, emissions_by_type: pd.Series):
+        """Create emissions distribution pie chart from per-type totals."""
+        fig = go.Figure(data=[go.Pie(
+            labels=emissions_by_type.index,
+            values=emissions_by_type.values,
+            hole=.3,
+            marker_colors=[ENERGY_COLORS[energy_type] for energy_type in emissions_by_type.index]
+        )])
         
-        st.plotly_chart(fig, use_container_width=True)
+        fig.update_layout(**EMISSIONS_PIE_LAYOUT)
+        fig.update_traces(**EMISSIONS_PIE_TRACE_STYLE)
+        return fig
+
+    def display_monthly_comparison(self, df: pd.DataFrame):
+        """Display monthly usage and emissions comparison."""
+        st.subheader("Monthly Comparison by Energy Type")
+        st.plotly_chart(self.create_monthly_comparison_chart(df), use_container_width=True, config=PLOTLY_CONFIG)
 
         # Monthly statistics by energy type
         for energy_type in ['electricity', 'gas']:
-            type_df = monthly_df[monthly_df['type'] == energy_type]
+            type_df = df[df['type'] == energy_type]
             
             st.subheader(f"{energy_type.capitalize()} Monthly Statistics")
             
@@ -325,64 +450,34 @@ class Dashboard:
                     f"{type_df['emissions_tonnes'].mean():,.2f} tCO2e"
                 )
 
-    def display_environmental_impact(self, df: pd.DataFrame):
+    def display_environmental_impact(self, carbon_metrics: Dict):
         """Display environmental impact metrics."""
-        total_emissions = df['emissions_tonnes'].sum()
+        total_emissions = carbon_metrics['total_emissions_tonnes']
         
-        trees_needed = int(total_emissions / TREE_ABSORPTION_RATE)
-        car_km = int(df['emissions_kg'].sum() / CAR_EMISSIONS_PER_KM)
-        homes_equivalent = int(total_emissions / HOME_ANNUAL_EMISSIONS)
+        # Trees, car km and homes from one division. Car km divides the kg
+        # total by the per-km rate as given; rescaling the rate to tonnes
+        # adds a rounding error that the int truncation would expose
+        equivalents = (
+            np.array([total_emissions, carbon_metrics['total_emissions_kg'], total_emissions])
+            / np.array([TREE_ABSORPTION_RATE, CAR_EMISSIONS_PER_KM, HOME_ANNUAL_EMISSIONS])
+        ).astype(int)
 
         # Display key metrics
         st.subheader("Environmental Impact")
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric("Trees Needed for Offset", f"{trees_needed:,d}")
-            st.markdown(f"🌳 Equivalent to planting {trees_needed:,d} trees")
-        
-        with col2:
-            st.metric("Car Travel Equivalent", f"{car_km:,d} km")
-            st.markdown(f"🚗 Equal to driving {car_km:,d} kilometers")
-        
-        with col3:
-            st.metric("Home Energy Equivalent", f"{homes_equivalent:,d}")
-            st.markdown(f"🏠 Equal to {homes_equivalent:,d} homes' annual usage")
+        for col, (label, value_template, caption_template), value in zip(st.columns(3), IMPACT_CARDS, equivalents):
+            with col:
+                st.metric(label, value_template.format(value))
+                st.markdown(caption_template.format(value))
 
         # Display emissions breakdown
         st.subheader("Emissions Breakdown")
         
-        # Create pie chart for emissions by type
-        emissions_by_type = df.groupby('type')['emissions_tonnes'].sum()
-        
-        fig = go.Figure(data=[go.Pie(
-            labels=emissions_by_type.index,
-            values=emissions_by_type.values,
-            hole=.3,
-            marker_colors=['#1f77b4', '#ff7f0e']
-        )])
-        
-        fig.update_layout(
-            title='Emissions Distribution by Energy Type',
-            showlegend=True
-        )
-        
-        fig.update_traces(
-            textposition='inside',
-            textinfo='percent+label',
-            hovertemplate="Energy Type: %{label}<br>Emissions: %{value:.1f} tCO2e<br>Percentage: %{percent}"
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        # Pie chart for emissions by type, reusing the grouped totals
+        pie_chart = self.create_emissions_pie_chart(carbon_metrics['emissions_by_type'])
+        st.plotly_chart(pie_chart, use_container_width=True, config=PLOTLY_CONFIG)
 
-    def display_reduction_targets(self, carbon_metrics: Dict):
-        """Display emission reduction targets and progress."""
-        baseline_emissions = carbon_metrics['total_emissions_tonnes']
-        targets = CarbonCalculator.set_reduction_targets(baseline_emissions)
-        
-        st.subheader("Emission Reduction Targets")
-        
-        # Create target visualization
+    def create_reduction_targets_chart(self, baseline_emissions: float, targets: Dict):
+        """Create the 5-year reduction trajectory from current emissions."""
         fig = go.Figure()
         
         # Current emissions
@@ -395,31 +490,39 @@ class Dashboard:
         ))
         
         # Target line
-        years = list(targets.keys())
-        emissions = list(targets.values())
         fig.add_trace(go.Scatter(
-            x=years,
-            y=emissions,
+            x=list(targets.keys()),
+            y=list(targets.values()),
             mode='lines+markers',
             name='Reduction Targets',
             line=dict(dash='dash', color='#ff7f0e')
         ))
         
-        fig.update_layout(
-            title='5-Year Emission Reduction Targets',
-            xaxis_title='Years from Now',
-            yaxis_title='Emissions (tCO2e)',
-            showlegend=True
+        fig.update_layout(**REDUCTION_TARGETS_LAYOUT)
+        return fig
+
+    def display_reduction_targets(self, carbon_metrics: Dict):
+        """Display emission reduction targets and progress."""
+        baseline_emissions = carbon_metrics['total_emissions_tonnes']
+        targets = CarbonCalculator.set_reduction_targets(baseline_emissions)
+        
+        st.subheader("Emission Reduction Targets")
+        st.plotly_chart(
+            self.create_reduction_targets_chart(baseline_emissions, targets),
+            use_container_width=True,
+            config=PLOTLY_CONFIG
         )
         
-        st.plotly_chart(fig, use_container_width=True)
+        years = np.fromiter(targets.keys(), dtype=int)
+        emissions = np.fromiter(targets.values(), dtype=float)
         
         # Display target table
+        required_reduction = baseline_emissions - emissions
         target_df = pd.DataFrame({
-            'Year': [datetime.now().year + year for year in years],
+            'Year': datetime.now().year + years,
             'Target Emissions (tCO2e)': emissions,
-            'Required Reduction (tCO2e)': [baseline_emissions - e for e in emissions],
-            'Reduction Percentage': [(baseline_emissions - e) / baseline_emissions * 100 for e in emissions]
+            'Required Reduction (tCO2e)': required_reduction,
+            'Reduction Percentage': required_reduction / baseline_emissions * 100
         })
         
         st.dataframe(target_df.round(2))
@@ -427,6 +530,13 @@ class Dashboard:
         """Display dashboard metrics, charts, and recommendations."""
         st.header("Energy & Carbon Dashboard")
         
+        # Usage totals and statistics per energy type in a single grouped pass
+        usage_stats = (
+            df.groupby('type')['kwh'].agg(['sum', 'mean', 'max'])
+            .reindex(['electricity', 'gas'])
+            .fillna({'sum': 0})
+        )
+        
         # Top-level metrics
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -437,25 +547,24 @@ class Dashboard:
         with col2:
             st.metric(
                 "Total Electricity Usage",
-                f"{df[df['type'] == 'electricity']['kwh'].sum():,.0f} kWh"
+                f"{usage_stats.at['electricity', 'sum']:,.0f} kWh"
             )
         with col3:
             st.metric(
                 "Total Gas Usage",
-                f"{df[df['type'] == 'gas']['kwh'].sum():,.0f} kWh"
+                f"{usage_stats.at['gas', 'sum']:,.0f} kWh"
             )
 
         # Display metrics for each energy type
-        for energy_type in ["electricity", "gas"]:
-            type_df = df[df['type'] == energy_type]
+        for energy_type, stats in usage_stats.iterrows():
             st.subheader(f"{energy_type.capitalize()} Metrics")
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Usage", f"{type_df['kwh'].sum():,.0f} kWh")
+                st.metric("Total Usage", f"{stats['sum']:,.0f} kWh")
             with col2:
-                st.metric("Average Monthly", f"{type_df['kwh'].mean():,.0f} kWh")
+                st.metric("Average Monthly", f"{stats['mean']:,.0f} kWh")
             with col3:
-                st.metric("Highest Month", f"{type_df['kwh'].max():,.0f} kWh")
+                st.metric("Highest Month", f"{stats['max']:,.0f} kWh")
 
         # Display emissions metrics
         st.subheader("Emissions Breakdown")
@@ -465,31 +574,37 @@ class Dashboard:
         with col2:
             st.metric("Scope 2 Emissions (Electricity)", f"{carbon_metrics['scope2_emissions_tonnes']:,.1f} tCO2e")
 
-        # Create tabs
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
-            "Usage & Emissions",
-            "Monthly Comparison",
-            "Environmental Impact",
-            "Reduction Targets",
-            "Raw Data"
-        ])
+        # Tab-style selector; unlike st.tabs, only the selected view is built
+        view = st.radio(
+            "View",
+            [
+                "Usage & Emissions",
+                "Monthly Comparison",
+                "Environmental Impact",
+                "Reduction Targets",
+                "Raw Data"
+            ],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="dashboard_view"
+        )
         
-        with tab1:
-            st.plotly_chart(self.create_usage_chart(df), use_container_width=True)
+        if view == "Usage & Emissions":
+            st.plotly_chart(self.create_usage_chart(df), use_container_width=True, config=PLOTLY_CONFIG)
             emissions_trend, emissions_vs_usage = self.create_emissions_charts(df)
-            st.plotly_chart(emissions_trend, use_container_width=True)
-            st.plotly_chart(emissions_vs_usage, use_container_width=True)
+            st.plotly_chart(emissions_trend, use_container_width=True, config=PLOTLY_CONFIG)
+            st.plotly_chart(emissions_vs_usage, use_container_width=True, config=PLOTLY_CONFIG)
 
-        with tab2:
+        elif view == "Monthly Comparison":
             self.display_monthly_comparison(df)
 
-        with tab3:
-            self.display_environmental_impact(df)
+        elif view == "Environmental Impact":
+            self.display_environmental_impact(carbon_metrics)
 
-        with tab4:
+        elif view == "Reduction Targets":
             self.display_reduction_targets(carbon_metrics)
 
-        with tab5:
+        else:  # Raw Data
             self.display_raw_data(df)
 
     def display_raw_data(self, df: pd.DataFrame):
@@ -521,46 +636,9 @@ class Dashboard:
         )
         
         # Download options
-        csv = filtered_df.to_csv(index=False)
         st.download_button(
             label="📥 Download Filtered Data (CSV)",
-            data=csv,
-            file_name="energy_data.csv",
-            mime="text/csv"
-        )   
-    def display_raw_data(self, df: pd.DataFrame):
-        """Display raw data with enhanced filtering and download options."""
-        st.subheader("Raw Data Analysis")
-        
-        # Add filters
-        energy_type = st.selectbox("Filter by Energy Type", ['All'] + list(df['type'].unique()))
-        date_range = st.date_input(
-            "Select Date Range",
-            [df['billing_period_start'].min(), df['billing_period_start'].max()]
-        )
-        
-        # Filter data
-        filtered_df = df.copy()
-        if energy_type != 'All':
-            filtered_df = filtered_df[filtered_df['type'] == energy_type]
-        filtered_df = filtered_df[
-            (filtered_df['billing_period_start'].dt.date >= date_range[0]) &
-            (filtered_df['billing_period_start'].dt.date <= date_range[1])
-        ]
-        
-        # Display data
-        st.dataframe(
-            filtered_df[[
-                'filename', 'billing_period_start', 'kwh',
-                'emissions_tonnes', 'carbon_factor', 'type'
-            ]].round(2)
-        )
-        
-        # Download options
-        csv = filtered_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Filtered Data (CSV)",
-            data=csv,
+            data=convert_df_to_csv(filtered_df),
             file_name="energy_data.csv",
             mime="text/csv"
         )
@@ -575,46 +653,56 @@ def validate_data(df: pd.DataFrame) -> Dict:
     }
     return validation_results
 
-def load_sample_data() -> List[Dict]:
-    """Load sample data for demonstration."""
-    sample_data = []
-    start_date = datetime.now().replace(day=1) - pd.DateOffset(months=12)
-    
-    # Define seasonal patterns
-    electricity_patterns = [
-        12000, 11500, 11000, 10500,  # Winter/Spring
-        10000, 9500, 9000, 8500,     # Spring/Summer
-        8000, 8500, 9000, 9500       # Summer/Fall
-    ]
-    
-    gas_patterns = [
-        7000, 7500, 7200, 7100,      # Winter/Spring
-        7000, 6900, 6800, 6700,      # Spring/Summer
-        6600, 6700, 6800, 6900       # Summer/Fall
-    ]
+def convert_df_to_csv(df: pd.DataFrame) -> bytes:
+    """Encode data as UTF-8 CSV for download."""
+    return df.to_csv(index=False).encode('utf-8')
+
+def prepare_dashboard_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """Add emissions columns to a copy of the data and calculate its carbon metrics."""
+    df = df.copy()
+    carbon_metrics = CarbonCalculator.calculate_metrics(df)
+    return df, carbon_metrics
+
+@st.cache_data(show_spinner=False)
+def load_sample_data(start_date: pd.Timestamp) -> pd.DataFrame:
+    """Load sample data for demonstration, covering the 12 months from start_date."""
+    # One electricity and one gas row per month, built column-wise
+    period_starts = pd.date_range(start_date, periods=12, freq='MS')
+    period_ends = period_starts + pd.offsets.MonthEnd(0)
     
-    for i in range(12):
-        date = start_date + pd.DateOffset(months=i)
-        
-        # Electricity data
-        sample_data.append({
-            'filename': f'sample_electricity_{i+1}',
-            'kwh': electricity_patterns[i],
-            'billing_period_start': date.strftime('%d/%m/%Y'),
-            'billing_period_end': (date + pd.DateOffset(months=1) - pd.DateOffset(days=1)).strftime('%d/%m/%Y'),
-            'type': 'electricity'
-        })
-        
-        # Gas data
-        sample_data.append({
-            'filename': f'sample_gas_{i+1}',
-            'kwh': gas_patterns[i],
-            'billing_period_start': date.strftime('%d/%m/%Y'),
-            'billing_period_end': (date + pd.DateOffset(months=1) - pd.DateOffset(days=1)).strftime('%d/%m/%Y'),
-            'type': 'gas'
+    return pd.DataFrame({
+        'filename': [f'sample_{energy_type}_{i+1}' for i in range(12) for energy_type in ('electricity', 'gas')],
+        'kwh': SAMPLE_USAGE_PATTERNS.ravel(),
+        'billing_period_start': period_starts.repeat(2),
+        'billing_period_end': period_ends.repeat(2),
+        'type': np.tile(['electricity', 'gas'], 12)
+    })
+
+def resize_manual_grid(grid: Optional[pd.DataFrame], n_months: int) -> pd.DataFrame:
+    """Return the manual entry grid with n_months rows, keeping the rows already entered."""
+    if grid is None:
+        return pd.DataFrame({
+            'billing_period_start': pd.date_range(
+                end=pd.Timestamp.now().normalize().replace(day=1), periods=n_months, freq='MS'
+            ),
+            'electricity_kwh': 0.0,
+            'gas_kwh': 0.0
         })
+    if len(grid) >= n_months:
+        return grid.head(n_months)
     
-    return sample_data
+    # New rows continue month by month after the latest entered month
+    last_month = grid['billing_period_start'].max()
+    if pd.isna(last_month):
+        next_month = pd.Timestamp.now().normalize().replace(day=1)
+    else:
+        next_month = pd.Timestamp(last_month) + pd.offsets.MonthBegin(1)
+    extra = pd.DataFrame({
+        'billing_period_start': pd.date_range(next_month, periods=n_months - len(grid), freq='MS'),
+        'electricity_kwh': 0.0,
+        'gas_kwh': 0.0
+    })
+    return pd.concat([grid, extra], ignore_index=True)
 
 def main():
     st.set_page_config(page_title="Energy & Carbon Dashboard", page_icon="⚡",layout="wide")
@@ -657,99 +745,124 @@ def main():
             )
 
         if electricity_files or gas_files:
-            data = []
+            # Extracted invoices are kept column-wise in session state, so only
+            # newly uploaded files are sent for extraction on each rerun
+            invoice_df = st.session_state.get('invoice_df')
+            processed_keys = set(invoice_df['invoice_key']) if invoice_df is not None else set()
+            # Invoices whose reply had no usable kWh or dates; at temperature 0
+            # a resend returns the same reply, so they wait for an explicit retry
+            failed_keys = st.session_state.get('failed_invoice_keys', set())
+            uploads = {
+                f"{energy_type}:{file.name}:{file.size}": (file, energy_type)
+                for energy_type, files in (('electricity', electricity_files), ('gas', gas_files))
+                for file in files or []
+            }
             
-            # Process electricity invoices
-            if electricity_files:
-                for file in electricity_files:
-                    result = InvoiceProcessor.process_pdf(file, 'electricity')
-                    if result:
-                        data.append(result)
+            new_rows = []
+            for invoice_key, (file, energy_type) in uploads.items():
+                if invoice_key in processed_keys or invoice_key in failed_keys:
+                    continue
+                result = InvoiceProcessor.process_pdf(file, energy_type)
+                if result:
+                    result['invoice_key'] = invoice_key
+                    new_rows.append(result)
             
-            # Process gas invoices
-            if gas_files:
-                for file in gas_files:
-                    result = InvoiceProcessor.process_pdf(file, 'gas')
-                    if result:
-                        data.append(result)
-
-            if data:
-                df = pd.DataFrame(data)
-                df['billing_period_start'] = pd.to_datetime(df['billing_period_start'], format='%d/%m/%Y')
-                df['billing_period_end'] = pd.to_datetime(df['billing_period_end'], format='%d/%m/%Y')
-                df = df.sort_values('billing_period_start')
+            if new_rows:
+                new_df = pd.DataFrame(new_rows)
+                # The API may return kWh as text or null; store it as a numeric column
+                new_df['kwh'] = pd.to_numeric(new_df['kwh'], errors='coerce')
+                new_df['billing_period_start'] = pd.to_datetime(new_df['billing_period_start'], format='%d/%m/%Y', errors='coerce')
+                new_df['billing_period_end'] = pd.to_datetime(new_df['billing_period_end'], format='%d/%m/%Y', errors='coerce')
+                
+                # Only store invoices that were fully extracted; failed ones are
+                # recorded instead of being kept as blank rows
+                extracted = new_df[['kwh', 'billing_period_start', 'billing_period_end']].notna().all(axis=1)
+                failed_keys = failed_keys | set(new_df.loc[~extracted, 'invoice_key'])
+                st.session_state['failed_invoice_keys'] = failed_keys
+                new_df = new_df[extracted]
+                
+                if not new_df.empty:
+                    invoice_df = new_df if invoice_df is None else pd.concat([invoice_df, new_df], ignore_index=True)
+                    # Sort once on ingest so reruns only need to filter
+                    invoice_df = invoice_df.sort_values('billing_period_start', ignore_index=True)
+                    st.session_state['invoice_df'] = invoice_df
+
+            failed_files = [file.name for invoice_key, (file, _) in uploads.items() if invoice_key in failed_keys]
+            if failed_files:
+                st.warning(f"Could not extract usage and billing dates from: {', '.join(failed_files)}")
+                st.button(
+                    "Retry failed invoices",
+                    on_click=st.session_state.pop,
+                    args=('failed_invoice_keys', None)
+                )
+
+            # Only report on invoices that are still uploaded
+            is_uploaded = invoice_df['invoice_key'].isin(list(uploads)) if invoice_df is not None else None
+            if is_uploaded is not None and is_uploaded.any():
+                df = invoice_df[is_uploaded]
                 
                 # Validate data
                 validation_results = validate_data(df)
                 if st.session_state.get('debug_mode', False):
                     st.write("Data Validation Results:", validation_results)
                 
-                carbon_metrics = CarbonCalculator.calculate_metrics(df)
+                df, carbon_metrics = prepare_dashboard_data(df)
                 dashboard.display_dashboard(df, carbon_metrics)
 
     elif input_method == "Manual Input":
         st.write("Enter your monthly electricity and gas usage data:")
         
-        manual_data = []
         n_months = st.number_input("Number of months to enter", min_value=1, max_value=24, value=12)
         
-        for i in range(n_months):
-            st.subheader(f"Month {i+1}")
-            col1, col2 = st.columns(2)
-            
-            month_date = st.date_input(f"Select Date for Month {i+1}", key=f"date_{i}")
-            
-            with col1:
-                st.write("Electricity Usage")
-                elec_kwh = st.number_input(
-                    "Electricity Usage (kWh)",
-                    min_value=0.0,
-                    value=0.0,
-                    key=f"elec_kwh_{i}"
-                )
-                
-            with col2:
-                st.write("Gas Usage")
-                gas_kwh = st.number_input(
-                    "Gas Usage (kWh)",
-                    min_value=0.0,
-                    value=0.0,
-                    key=f"gas_kwh_{i}"
-                )
-            
-            if elec_kwh > 0:
-                manual_data.append({
-                    'filename': f'manual_electricity_{i+1}',
-                    'kwh': elec_kwh,
-                    'billing_period_start': month_date,
-                    'billing_period_end': month_date + pd.DateOffset(months=1) - pd.DateOffset(days=1),
-                    'type': 'electricity'
-                })
+        # Single editable grid with one row per month. data_editor drops its
+        # edits whenever its data changes, so the grid is kept in session
+        # state and only resized, never rebuilt from defaults
+        grid = resize_manual_grid(st.session_state.get('manual_grid'), n_months)
+        st.session_state['manual_grid'] = grid
+        
+        # Batch grid edits into a single rerun on submit
+        with st.form("manual_input_form"):
+            manual_df = st.data_editor(
+                grid,
+                num_rows="fixed",
+                hide_index=True,
+                column_config={
+                    'billing_period_start': st.column_config.DateColumn("Month Start", format="DD/MM/YYYY"),
+                    'electricity_kwh': st.column_config.NumberColumn("Electricity Usage (kWh)", min_value=0.0),
+                    'gas_kwh': st.column_config.NumberColumn("Gas Usage (kWh)", min_value=0.0)
+                },
+                key="manual_data_editor"
+            )
+            generate = st.form_submit_button("Generate Dashboard")
+
+        if generate:
+            st.session_state['manual_grid'] = manual_df
             
-            if gas_kwh > 0:
-                manual_data.append({
-                    'filename': f'manual_gas_{i+1}',
-                    'kwh': gas_kwh,
-                    'billing_period_start': month_date,
-                    'billing_period_end': month_date + pd.DateOffset(months=1) - pd.DateOffset(days=1),
-                    'type': 'gas'
-                })
-
-        if st.button("Generate Dashboard") and manual_data:
-            df = pd.DataFrame(manual_data)
-            df['billing_period_start'] = pd.to_datetime(df['billing_period_start'])
-            df['billing_period_end'] = pd.to_datetime(df['billing_period_end'])
-            carbon_metrics = CarbonCalculator.calculate_metrics(df)
+            # Reshape the grid into one row per month and energy type
+            month_starts = pd.to_datetime(manual_df['billing_period_start'])
+            month_ends = month_starts + pd.DateOffset(months=1) - pd.DateOffset(days=1)
+            df = pd.DataFrame({
+                'filename': [f'manual_{energy_type}_{i+1}' for i in range(len(manual_df)) for energy_type in ('electricity', 'gas')],
+                'kwh': manual_df[['electricity_kwh', 'gas_kwh']].to_numpy(dtype=float).ravel(),
+                'billing_period_start': month_starts.to_numpy().repeat(2),
+                'billing_period_end': month_ends.to_numpy().repeat(2),
+                'type': np.tile(['electricity', 'gas'], len(manual_df))
+            })
+            # Keep the submitted data so the dashboard survives later reruns,
+            # such as switching views, the way the upload path keeps invoice_df
+            st.session_state['manual_df'] = df[df['kwh'] > 0].reset_index(drop=True)
+        
+        df = st.session_state.get('manual_df')
+        if df is not None and not df.empty:
+            df, carbon_metrics = prepare_dashboard_data(df)
             dashboard.display_dashboard(df, carbon_metrics)
 
     else:  # Sample Data
-        sample_data = load_sample_data()
-        df = pd.DataFrame(sample_data)
-        df['billing_period_start'] = pd.to_datetime(df['billing_period_start'], format='%d/%m/%Y')
-        df['billing_period_end'] = pd.to_datetime(df['billing_period_end'], format='%d/%m/%Y')
-        df = df.sort_values('billing_period_start')
+        # Key the cached sample on its first month so it rolls over with the calendar
+        start_date = pd.Timestamp.now().normalize().replace(day=1) - pd.DateOffset(months=12)
+        df = load_sample_data(start_date).sort_values('billing_period_start')
         
-        carbon_metrics = CarbonCalculator.calculate_metrics(df)
+        df, carbon_metrics = prepare_dashboard_data(df)
         dashboard.display_dashboard(df, carbon_metrics)
 
 if __name__ == "__main__":